@@ -27,6 +27,13 @@ def require_auth(request: Request) -> SessionUser:
     return su
 
 
+def require_admin(request: Request) -> SessionUser:
+    su = require_auth(request)
+    if su.role != "admin":
+        raise HTTPException(status_code=403, detail="Réservé aux administrateurs")
+    return su
+
+
 @router.post("/register")
 def auth_register(payload: RegisterIn, request: Request):
     try:
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends
 from models import ChatSendIn, SessionUser
 from auth_routes import require_auth
 import state
+import tracing
 from iot_routes import iot_send
 
 
@@ -10,9 +11,12 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 
 
 @router.get("/messages")
+@tracing.profiled("GET /chat/messages")
 def chat_messages_api(user: SessionUser = Depends(require_auth)):
+    messages = list(state.chat_messages)
+    tracing.mark_delivered(messages)
     return {
-        "messages": state.chat_messages,
+        "messages": [tracing.public(m) for m in messages],
         "connected": state.mqtt_connected,
     }
 
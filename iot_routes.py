@@ -6,21 +6,27 @@ import paho.mqtt.client as mqtt
 from models import ChatSendIn, SessionUser
 from auth_routes import require_auth
 import state
+import tracing
 
 
 router = APIRouter(prefix="/iot", tags=["iot"])
 
 
 @router.get("/latest")
+@tracing.profiled("GET /iot/latest")
 def iot_latest(user: SessionUser = Depends(require_auth)):
+    last = state.last_message
+    if last is not None:
+        tracing.mark_delivered([last])
     return {
         "connected": state.mqtt_connected,
         "topic": state.MQTT_SUB_TOPIC,
-        "last": state.last_message,
+        "last": tracing.public(last),
     }
 
 
 @router.post("/send")
+@tracing.profiled("POST /iot/send")
 def iot_send(payload: ChatSendIn, user: SessionUser = Depends(require_auth)):
     """
     Envoie un message depuis le site vers MQTT.
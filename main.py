@@ -13,6 +13,11 @@ from pydantic import BaseModel, Field
 from passlib.hash import pbkdf2_sha256
 import paho.mqtt.client as mqtt
 
+import tracing
+import trace_routes
+import spectrogram
+import spectrogram_routes
+
 # ==========================
 # Chemins / fichiers
 # ==========================
@@ -46,12 +51,19 @@ def _on_connect(client, userdata, flags, rc):
         print(f"[mqtt] Connected to {MQTT_HOST}:{MQTT_PORT}")
         client.subscribe(MQTT_SUB_TOPIC)
         print(f"[mqtt] Subscribed to {MQTT_SUB_TOPIC}")
+        # Topics audio supplémentaires (waterfall uniquement)
+        for topic in spectrogram.SPECTRO_TOPICS:
+            if topic != MQTT_SUB_TOPIC:
+                client.subscribe(topic)
+                print(f"[mqtt] Subscribed to {topic}")
     else:
         mqtt_connected = False
         print("[mqtt] connect error rc=", rc)
 
+@tracing.traced("mqtt.on_message")
 def _on_message(client, userdata, msg):
     global last_message, last_sent_raw_from_web
+    trace = tracing.start_trace(msg)
     raw = msg.payload.decode(errors="ignore")
     
     # IMPORTANT : Ignorer l'écho de notre propre message
@@ -69,17 +81,25 @@ def _on_message(client, userdata, msg):
         payload = json.loads(raw)
     except Exception:
         payload = raw
+    tracing.mark(trace, "parsed")
     
     message_data = {
         "topic": msg.topic,
         "payload": payload,
         "raw": raw,
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "trace": trace,
     }
     
     last_message = message_data
-    message_history.append(message_data)
-    print("[mqtt] message:", message_data)
+    # Seul le topic du chat va dans l'historique (les autres sont des topics audio)
+    if msg.topic == MQTT_SUB_TOPIC:
+        message_history.append(message_data)
+    tracing.mark(trace, "stored")
+    print("[mqtt] message:", tracing.public(message_data))
+
+    # Les trames de spectre alimentent aussi le waterfall du topic audio
+    spectrogram.add_frame(msg.topic, payload)
 
 def _mqtt_loop():
     global mqtt_client
@@ -163,6 +183,8 @@ app.add_middleware(
     session_cookie="webiot_session",
     max_age=60 * 60 * 24,
 )
+# Ajouté en dernier = le plus externe : mesure session + route + sérialisation
+app.add_middleware(tracing.TracingMiddleware)
 
 api = APIRouter(prefix="/api")
 
@@ -233,14 +255,19 @@ def auth_me(request: Request):
 # IoT / MQTT
 # ==========================
 @api.get("/iot/latest")
+@tracing.profiled("GET /iot/latest")
 def iot_latest(user: SessionUser = Depends(require_auth)):
+    last = last_message
+    if last is not None:
+        tracing.mark_delivered([last])
     return {
         "connected": mqtt_connected,
         "subTopic": MQTT_SUB_TOPIC,
-        "last": last_message,
+        "last": tracing.public(last),
     }
 
 @api.post("/iot/send")
+@tracing.profiled("POST /iot/send")
 def iot_send(payload: ChatSendIn, user: SessionUser = Depends(require_auth)):
     global last_sent_raw_from_web
     
@@ -287,9 +314,12 @@ def chat_send(payload: ChatSendIn, user: SessionUser = Depends(require_auth)):
     return iot_send(payload, user)
 
 @api.get("/chat/messages")
+@tracing.profiled("GET /chat/messages")
 def chat_messages(user: SessionUser = Depends(require_auth)):
+    messages = list(message_history)
+    tracing.mark_delivered(messages)
     return {
-        "messages": list(message_history),
+        "messages": [tracing.public(m) for m in messages],
         "connected": mqtt_connected,
     }
 
@@ -300,6 +330,16 @@ def chat_messages(user: SessionUser = Depends(require_auth)):
 def health():
     return {"status": "ok"}
 
+# ==========================
+# Spectrogramme audio
+# ==========================
+api.include_router(spectrogram_routes.router)
+
+# ==========================
+# Tracing (admin)
+# ==========================
+api.include_router(trace_routes.router)
+
 # Monter l'API
 app.include_router(api)
 
@@ -4,7 +4,9 @@ import threading
 
 import paho.mqtt.client as mqtt
 
+import spectrogram
 import state
+import tracing
 
 
 def _on_connect(client, userdata, flags, rc):
@@ -12,11 +14,16 @@ def _on_connect(client, userdata, flags, rc):
         state.mqtt_connected = True
         print(f"[MQTT] Connected to {state.MQTT_HOST}:{state.MQTT_PORT}")
         client.subscribe(state.MQTT_SUB_TOPIC)
+        # Topics audio supplémentaires (waterfall uniquement)
+        for topic in spectrogram.SPECTRO_TOPICS:
+            if topic != state.MQTT_SUB_TOPIC:
+                client.subscribe(topic)
     else:
         state.mqtt_connected = False
         print("[MQTT] connect error rc=", rc)
 
 
+@tracing.traced("mqtt.on_message")
 def _on_message(client, userdata, msg):
     """
     Callback quand un message arrive sur MQTT.
@@ -30,6 +37,7 @@ def _on_message(client, userdata, msg):
       -> on l'ignore également pour ne pas polluer le chat.
     - Tous les autres messages sont ajoutés dans l'historique comme "device".
     """
+    trace = tracing.start_trace(msg)
     raw = msg.payload.decode(errors="ignore")
 
     # Ignorer l'écho du dernier message envoyé par le site
@@ -48,6 +56,7 @@ def _on_message(client, userdata, msg):
     except Exception:
         # pas du JSON -> texte brut
         payload = raw
+    tracing.mark(trace, "parsed")
 
     ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
     state.last_message = {
@@ -55,8 +64,8 @@ def _on_message(client, userdata, msg):
         "payload": payload,
         "raw": raw,
         "timestamp": ts,
+        "trace": trace,
     }
-    print("[MQTT] msg:", state.last_message)
 
     if msg.topic == state.MQTT_SUB_TOPIC:
         state.add_chat(
@@ -66,8 +75,14 @@ def _on_message(client, userdata, msg):
                 "payload": payload,
                 "raw": raw,
                 "timestamp": ts,
+                "trace": trace,
             }
         )
+    tracing.mark(trace, "stored")
+    print("[MQTT] msg:", tracing.public(state.last_message))
+
+    # Les trames de spectre alimentent aussi le waterfall du topic audio
+    spectrogram.add_frame(msg.topic, payload)
 
 
 def _loop():
@@ -11,11 +11,14 @@ const topicSpan = document.getElementById("mqtt-topic");
 const lastUpdateSpan = document.getElementById("last-update");
 const dominantFreqSpan = document.getElementById("dominant-freq");
 const avgLevelSpan = document.getElementById("avg-level");
+const waterfallImg = document.getElementById("waterfall-img");
 
 let animationId = null;
 let isRunning = false;
 let spectrumData = [];
 let lastTimestamp = null;
+let waterfallInterval = null;
+let waterfallUrl = null;
 
 // Configuration du canvas
 if (canvas && ctx) {
@@ -145,6 +148,34 @@ function drawSpectrum(data) {
   ctx.fillText("~22 kHz", width - 5, height - 5);
 }
 
+// Historique (waterfall) : image calculée côté serveur sur les 60 dernières secondes
+async function refreshWaterfall() {
+  if (!waterfallImg) return;
+  try {
+    const res = await fetch("/api/iot/spectrogram?format=png&seconds=60&width=400&height=100");
+    if (!res.ok) return; // 404 tant qu'aucun spectre n'a été reçu
+
+    const blob = await res.blob();
+    if (waterfallUrl) URL.revokeObjectURL(waterfallUrl);
+    waterfallUrl = URL.createObjectURL(blob);
+    waterfallImg.src = waterfallUrl;
+  } catch (err) {
+    console.error("Erreur lors de la récupération du spectrogramme:", err);
+  }
+}
+
+function startWaterfall() {
+  refreshWaterfall();
+  waterfallInterval = setInterval(refreshWaterfall, 1000);
+}
+
+function stopWaterfall() {
+  if (waterfallInterval) {
+    clearInterval(waterfallInterval);
+    waterfallInterval = null;
+  }
+}
+
 // Boucle d'animation
 async function animate() {
   if (!isRunning) return;
@@ -166,6 +197,7 @@ if (btnStart) {
       btnStart.disabled = true;
       btnStop.disabled = false;
       animate();
+      startWaterfall();
     }
   });
 }
@@ -178,6 +210,7 @@ if (btnStop) {
       cancelAnimationFrame(animationId);
       animationId = null;
     }
+    stopWaterfall();
     btnStart.disabled = false;
     btnStop.disabled = true;
   });
@@ -189,4 +222,5 @@ window.addEventListener("beforeunload", () => {
   if (animationId) {
     cancelAnimationFrame(animationId);
   }
+  stopWaterfall();
 });
\ No newline at end of file
@@ -0,0 +1,245 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# ==========================
+# Config spectrogramme
+# ==========================
+
+# Nombre de trames gardées par topic (6000 trames = 10 min à 10 fps)
+SPECTRO_FRAMES = int(os.environ.get("SPECTRO_FRAMES", "6000"))
+SPECTRO_MIN_BINS = int(os.environ.get("SPECTRO_MIN_BINS", "8"))
+SPECTRO_MAX_BINS = int(os.environ.get("SPECTRO_MAX_BINS", "2048"))
+# Trames consécutives d'une autre taille avant de repartir de zéro
+# (l'ESP32 a changé de nombre de bins, pas un message isolé)
+SPECTRO_RESET_AFTER = int(os.environ.get("SPECTRO_RESET_AFTER", "20"))
+
+# Fenêtre maximale demandable sur /iot/spectrogram
+SPECTRO_MAX_SECONDS = float(os.environ.get("SPECTRO_MAX_SECONDS", "3600"))
+
+# Topics audio, séparés par des virgules : un buffer par topic.
+# Par défaut le topic écouté par main.py ; le premier sert de topic par défaut.
+SPECTRO_TOPICS = tuple(
+    t.strip()
+    for t in (os.environ.get("SPECTRO_TOPIC") or os.environ.get("MQTT_SUB_TOPIC", "iot/demo")).split(",")
+    if t.strip()
+)
+
+
+class Spectrogram:
+    """
+    Buffer circulaire 2D (trames x bins) pour un topic audio.
+
+    La matrice est allouée une seule fois puis écrite sur place.
+    Chaque trame est quantifiée en uint8 par rapport à son propre maximum,
+    gardé à côté (scale) pour pouvoir retrouver les valeurs d'origine.
+    """
+
+    def __init__(self, bins: int, capacity: int = SPECTRO_FRAMES):
+        self.bins = bins
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, bins), dtype=np.uint8)
+        self.scale = np.zeros(capacity, dtype=np.float32)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.head = 0  # prochaine ligne à écrire
+        self.lock = threading.Lock()
+        # Trames d'une autre taille reçues d'affilée
+        self.other_bins = 0
+        self.other_count = 0
+
+    def append(self, frame: np.ndarray, ts: float) -> None:
+        peak = float(frame.max()) if frame.size else 0.0
+        with self.lock:
+            if self.count:
+                # Garder les timestamps croissants (recherche par searchsorted)
+                ts = max(ts, float(self.times[self.head - 1]))
+            row = self.frames[self.head]
+            if peak > 0:
+                np.multiply(frame, 255.0 / peak, out=frame)
+                np.rint(frame, out=frame)
+                row[:] = frame
+            else:
+                row.fill(0)
+            self.scale[self.head] = peak
+            self.times[self.head] = ts
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def window(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Trames (dé-quantifiées, float32) et timestamps entre start et end, dans l'ordre."""
+        with self.lock:
+            order = (self.head - self.count + np.arange(self.count)) % self.capacity
+            times = self.times[order]
+            lo = int(np.searchsorted(times, start, side="left"))
+            hi = int(np.searchsorted(times, end, side="right"))
+            rows = order[lo:hi]
+            q = self.frames[rows]
+            scale = self.scale[rows]
+        values = q.astype(np.float32)
+        values *= (scale / 255.0)[:, None]
+        return values, times[lo:hi]
+
+
+# ==========================
+# État en mémoire
+# ==========================
+
+_buffers: Dict[str, Spectrogram] = {}
+_buffers_lock = threading.Lock()
+
+
+def extract_frame(payload: Any) -> Optional[np.ndarray]:
+    """
+    Extrait une trame de spectre d'un payload MQTT.
+    Mêmes formats que audio-spectrum.js : {spectrum: [...]}, [...] ou {data: [...]},
+    avec uniquement des nombres et au moins SPECTRO_MIN_BINS valeurs.
+    """
+    values = None
+    if isinstance(payload, list):
+        values = payload
+    elif isinstance(payload, dict):
+        if isinstance(payload.get("spectrum"), list):
+            values = payload["spectrum"]
+        elif isinstance(payload.get("data"), list):
+            values = payload["data"]
+    if values is None or not SPECTRO_MIN_BINS <= len(values) <= SPECTRO_MAX_BINS:
+        return None
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return None
+    try:
+        frame = np.asarray(values, dtype=np.float32)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    np.nan_to_num(frame, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    np.maximum(frame, 0.0, out=frame)
+    return frame
+
+
+def add_frame(topic: str, payload: Any, ts: Optional[float] = None) -> bool:
+    """
+    Ajoute une trame au spectrogramme du topic audio si le payload en contient une.
+
+    Appelé depuis le callback MQTT : ne lève jamais d'exception, un payload
+    invalide ne doit pas arrêter la boucle paho.
+    """
+    if topic not in SPECTRO_TOPICS:
+        return False
+    try:
+        frame = extract_frame(payload)
+        if frame is None:
+            return False
+        with _buffers_lock:
+            buf = _buffers.get(topic)
+            if buf is None:
+                buf = _buffers[topic] = Spectrogram(frame.size)
+            elif buf.bins != frame.size:
+                if buf.other_bins != frame.size:
+                    buf.other_bins, buf.other_count = frame.size, 0
+                buf.other_count += 1
+                if buf.other_count < SPECTRO_RESET_AFTER:
+                    return False
+                # Nombre de bins changé côté ESP32 : on repart de zéro
+                buf = _buffers[topic] = Spectrogram(frame.size)
+            else:
+                buf.other_count = 0
+        buf.append(frame, time.time() if ts is None else ts)
+        return True
+    except Exception as e:
+        print("[SPECTRO] frame error:", e)
+        return False
+
+
+def get(topic: str) -> Optional[Spectrogram]:
+    with _buffers_lock:
+        return _buffers.get(topic)
+
+
+# ==========================
+# Rendu
+# ==========================
+
+def _pool(values: np.ndarray, size: int, axis: int, reduce: np.ufunc) -> np.ndarray:
+    """
+    Réduit `values` à `size` éléments le long de `axis` (min/max pooling).
+    Si size dépasse la taille d'origine, les éléments sont répétés (plus proche voisin).
+    """
+    n = values.shape[axis]
+    edges = (np.arange(size) * n) // size
+    return reduce.reduceat(values, edges, axis=axis)
+
+
+def _time_columns(values: np.ndarray, times: np.ndarray, start: float, end: float,
+                  width: int, reduce: np.ufunc) -> np.ndarray:
+    """
+    Regroupe les trames en `width` colonnes de même durée entre start et end.
+    Les colonnes sans trame (trou de réception) restent à 0.
+    """
+    edges = np.searchsorted(times, np.linspace(start, end, width + 1), side="left")
+    edges[-1] = len(times)  # la dernière colonne inclut les trames à t == end
+    filled = edges[:-1] < edges[1:]
+    columns = np.zeros((width, values.shape[1]), dtype=np.float32)
+    # Les débuts des colonnes non vides se suivent : chaque segment de reduceat
+    # s'arrête exactement au début de la colonne non vide suivante.
+    columns[filled] = reduce.reduceat(values, edges[:-1][filled], axis=0)
+    return columns
+
+
+def render(
+    buf: Spectrogram,
+    start: float,
+    end: float,
+    width: int,
+    height: int,
+    mode: str = "max",
+) -> Optional[Dict[str, Any]]:
+    """
+    Décime la fenêtre [start, end] en une matrice uint8 height x width.
+
+    Chaque colonne couvre (end - start) / width secondes, colonne 0 = début de
+    la fenêtre ; ligne 0 = fréquence la plus haute (même orientation qu'une
+    image). Les valeurs sont normalisées par le maximum de la fenêtre,
+    renvoyé dans "scale".
+    """
+    values, times = buf.window(start, end)
+    if values.shape[0] == 0:
+        return None
+    reduce = np.minimum if mode == "min" else np.maximum
+    pooled = _time_columns(values, times, start, end, width, reduce)  # width x bins
+    pooled = _pool(pooled, height, 1, reduce)                          # width x height
+    peak = float(pooled.max())
+    if peak > 0:
+        pooled *= 255.0 / peak
+    matrix = np.ascontiguousarray(np.rint(pooled).astype(np.uint8).T[::-1])
+    return {
+        "matrix": matrix,
+        "scale": peak,
+        "frames": int(values.shape[0]),
+        "start": float(start),
+        "end": float(end),
+    }
+
+
+def to_png(matrix: np.ndarray) -> bytes:
+    """Encode une matrice uint8 en PNG niveaux de gris (sans dépendance externe)."""
+    height, width = matrix.shape
+    # Chaque ligne PNG commence par un octet de filtre (0 = aucun)
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = matrix
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
@@ -0,0 +1,65 @@
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+
+from models import SessionUser
+from auth_routes import require_auth
+import spectrogram
+import tracing
+
+
+router = APIRouter(prefix="/iot", tags=["iot"])
+
+
+@router.get("/spectrogram")
+@tracing.profiled("GET /iot/spectrogram")
+def iot_spectrogram(
+    topic: Optional[str] = None,
+    seconds: float = Query(60, gt=0, le=spectrogram.SPECTRO_MAX_SECONDS, allow_inf_nan=False),
+    end: Optional[float] = Query(None, allow_inf_nan=False),
+    width: int = Query(400, ge=1, le=4096),
+    height: int = Query(128, ge=1, le=2048),
+    format: str = Query("bin", pattern="^(bin|png)$"),
+    mode: str = Query("max", pattern="^(max|min)$"),
+    user: SessionUser = Depends(require_auth),
+):
+    """
+    Historique du spectre audio (waterfall) sur une fenêtre de temps.
+
+    `topic` doit faire partie de SPECTRO_TOPIC (le premier par défaut).
+
+    La fenêtre [end - seconds, end] (timestamps epoch, end = maintenant par défaut)
+    est décimée en height x width par min/max pooling puis renvoyée :
+    - format=bin : matrice uint8 brute, ligne par ligne (ligne 0 = hautes fréquences)
+    - format=png : la même matrice en image niveaux de gris
+
+    Chaque colonne couvre seconds / width secondes ; les colonnes sans trame sont à 0.
+    Les dimensions et la fenêtre sont dans les en-têtes X-Spectrogram-*.
+    """
+    topic = topic or spectrogram.SPECTRO_TOPICS[0]
+    if topic not in spectrogram.SPECTRO_TOPICS:
+        raise HTTPException(status_code=404, detail="Topic audio inconnu.")
+    buf = spectrogram.get(topic)
+    if buf is None:
+        raise HTTPException(status_code=404, detail="Aucun spectre reçu sur ce topic.")
+
+    end = time.time() if end is None else end
+    result = spectrogram.render(buf, end - seconds, end, width, height, mode)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Aucune trame sur cette période.")
+
+    matrix = result["matrix"]
+    headers = {
+        "X-Spectrogram-Width": str(matrix.shape[1]),
+        "X-Spectrogram-Height": str(matrix.shape[0]),
+        "X-Spectrogram-Bins": str(buf.bins),
+        "X-Spectrogram-Frames": str(result["frames"]),
+        "X-Spectrogram-Start": f"{result['start']:.3f}",
+        "X-Spectrogram-End": f"{result['end']:.3f}",
+        "X-Spectrogram-Scale": f"{result['scale']:.6g}",
+        "Cache-Control": "no-store",
+    }
+    if format == "png":
+        return Response(spectrogram.to_png(matrix), media_type="image/png", headers=headers)
+    return Response(matrix.tobytes(), media_type="application/octet-stream", headers=headers)
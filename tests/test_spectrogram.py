@@ -0,0 +1,151 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import spectrogram
+
+
+TOPIC = spectrogram.SPECTRO_TOPICS[0]
+
+
+@pytest.fixture(autouse=True)
+def clear_buffers():
+    spectrogram._buffers.clear()
+    yield
+    spectrogram._buffers.clear()
+
+
+def frame(bins=16, value=1.0):
+    return {"spectrum": [value] * bins}
+
+
+def test_huge_integer_payload_is_ignored():
+    payload = [int("1" * 400), 2] + [0] * 10
+    assert spectrogram.extract_frame(payload) is None
+    assert spectrogram.add_frame(TOPIC, payload) is False
+
+
+def test_add_frame_never_raises(monkeypatch):
+    def boom(payload):
+        raise OverflowError("boom")
+
+    with monkeypatch.context() as m:
+        m.setattr(spectrogram, "extract_frame", boom)
+        assert spectrogram.add_frame(TOPIC, frame()) is False
+    assert spectrogram.add_frame(TOPIC, {"spectrum": [float("inf")] * 16}) is True
+    assert spectrogram.add_frame(TOPIC, {"spectrum": [[1, 2]] * 16}) is False
+    assert spectrogram.add_frame(TOPIC, object()) is False
+
+
+def test_non_spectrum_payloads_are_ignored():
+    assert spectrogram.add_frame(TOPIC, "hello") is False
+    assert spectrogram.add_frame(TOPIC, [1, 2, 3]) is False
+    assert spectrogram.add_frame(TOPIC, ["1"] * 16) is False
+    assert spectrogram.add_frame(TOPIC, [True] * 16) is False
+    assert spectrogram.add_frame("other/topic", frame()) is False
+    assert spectrogram.get(TOPIC) is None
+
+
+def test_one_buffer_per_audio_topic(monkeypatch):
+    monkeypatch.setattr(spectrogram, "SPECTRO_TOPICS", ("audio/a", "audio/b"))
+    assert spectrogram.add_frame("audio/a", frame(16)) is True
+    assert spectrogram.add_frame("audio/b", frame(32)) is True
+    assert spectrogram.get("audio/a").bins == 16
+    assert spectrogram.get("audio/b").bins == 32
+
+
+def test_stray_list_does_not_reset_history():
+    for i in range(5):
+        spectrogram.add_frame(TOPIC, frame(16), ts=100 + i)
+    buf = spectrogram.get(TOPIC)
+
+    assert spectrogram.add_frame(TOPIC, frame(32), ts=106) is False
+    assert spectrogram.add_frame(TOPIC, frame(16), ts=107) is True
+    assert spectrogram.get(TOPIC) is buf
+    assert buf.count == 6
+
+
+def test_bin_count_change_resets_after_consecutive_frames():
+    spectrogram.add_frame(TOPIC, frame(16), ts=100)
+    for i in range(spectrogram.SPECTRO_RESET_AFTER):
+        spectrogram.add_frame(TOPIC, frame(32), ts=101 + i)
+    assert spectrogram.get(TOPIC).bins == 32
+
+
+def test_ring_buffer_wraparound_keeps_order():
+    buf = spectrogram.Spectrogram(bins=2, capacity=3)
+    for i in range(5):
+        buf.append(np.array([i + 1, 0], dtype=np.float32), ts=float(i))
+
+    values, times = buf.window(0, 10)
+    assert times.tolist() == [2.0, 3.0, 4.0]
+    assert values[:, 0].tolist() == [3.0, 4.0, 5.0]
+
+
+def test_window_selects_time_range():
+    buf = spectrogram.Spectrogram(bins=2, capacity=10)
+    for i in range(10):
+        buf.append(np.array([1, 1], dtype=np.float32), ts=float(i))
+    _, times = buf.window(3, 6)
+    assert times.tolist() == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_pool_upsamples_when_size_exceeds_length():
+    values = np.array([[1.0, 5.0, 2.0]])
+    pooled = spectrogram._pool(values, 6, 1, np.maximum)
+    assert pooled.tolist() == [[1.0, 1.0, 5.0, 5.0, 2.0, 2.0]]
+
+
+def test_pool_downsamples_with_min_and_max():
+    values = np.array([[1.0, 4.0, 2.0, 8.0]])
+    assert spectrogram._pool(values, 2, 1, np.maximum).tolist() == [[4.0, 8.0]]
+    assert spectrogram._pool(values, 2, 1, np.minimum).tolist() == [[1.0, 2.0]]
+
+
+def test_render_leaves_gaps_empty():
+    buf = spectrogram.Spectrogram(bins=1, capacity=100)
+    for ts in (0.0, 0.5, 1.0):
+        buf.append(np.array([1], dtype=np.float32), ts)
+    for ts in (50.0, 50.5, 51.0):
+        buf.append(np.array([5], dtype=np.float32), ts)
+
+    result = spectrogram.render(buf, 0, 60, width=6, height=1)
+    assert result["matrix"].tolist() == [[51, 0, 0, 0, 0, 255]]
+    assert result["frames"] == 6
+    assert (result["start"], result["end"]) == (0.0, 60.0)
+
+
+def test_render_orientation():
+    buf = spectrogram.Spectrogram(bins=2, capacity=10)
+    buf.append(np.array([0, 10], dtype=np.float32), 0.0)
+    buf.append(np.array([10, 0], dtype=np.float32), 1.0)
+
+    matrix = spectrogram.render(buf, 0, 1, width=2, height=2)["matrix"]
+    # ligne 0 = hautes fréquences, colonne 0 = début de la fenêtre
+    assert matrix.tolist() == [[255, 0], [0, 255]]
+
+
+def _decode_png(data: bytes) -> np.ndarray:
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, chunks = 8, {}
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos:pos + 4])
+        kind = data[pos + 4:pos + 8]
+        body = data[pos + 8:pos + 8 + length]
+        (crc,) = struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(kind + body) & 0xFFFFFFFF
+        chunks[kind] = body
+        pos += 12 + length
+    width, height, depth, color, _, _, _ = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    assert (depth, color) == (8, 0)
+    raw = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8)
+    rows = raw.reshape(height, width + 1)
+    assert not rows[:, 0].any()  # filtre 0 sur chaque ligne
+    return rows[:, 1:]
+
+
+def test_png_round_trip():
+    matrix = np.arange(3 * 7, dtype=np.uint8).reshape(3, 7) * 12
+    assert np.array_equal(_decode_png(spectrogram.to_png(matrix)), matrix)
@@ -0,0 +1,169 @@
+import asyncio
+import cProfile
+import threading
+import time
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture(autouse=True)
+def sample_everything(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    tracing.reset()
+    tracing._slowest.clear()
+    yield
+    tracing.reset()
+    tracing._slowest.clear()
+
+
+class FakeMsg:
+    def __init__(self):
+        self.timestamp = time.monotonic()
+
+
+class FakeRoute:
+    path = "/api/chat/messages"
+
+
+def stored_message():
+    trace = tracing.start_trace(FakeMsg())
+    tracing.mark(trace, "parsed")
+    tracing.mark(trace, "stored")
+    return {"payload": "hello", "trace": trace}
+
+
+def delivered_count():
+    return tracing.snapshot()["stages"].get("delivered", {}).get("count", 0)
+
+
+def run_request(app):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/api/chat/messages", "method": "GET"}
+    asyncio.run(tracing.TracingMiddleware(app)(scope, None, send))
+    return sent
+
+
+def test_message_delivered_twice_is_recorded_once():
+    msg = stored_message()
+    tracing.mark_delivered([msg])
+    tracing.mark_delivered([msg])
+    assert delivered_count() == 1
+
+
+def test_concurrent_polls_record_once():
+    msg = stored_message()
+    threads = [threading.Thread(target=tracing.mark_delivered, args=([msg],)) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert delivered_count() == 1
+
+
+def test_stale_delivery_is_ignored(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DELIVERY_MAX_MS", 0.0)
+    msg = stored_message()
+    time.sleep(0.001)
+    tracing.mark_delivered([msg])
+    assert delivered_count() == 0
+    assert msg["trace"]["delivered"] is not None
+
+
+def test_finish_records_stages_in_order():
+    msg = stored_message()
+    tracing.mark_delivered([msg])
+    stages = tracing.snapshot()["stages"]
+    assert list(stages) == ["callback", "parsed", "stored", "delivered", "total"]
+
+
+def test_delivery_deferred_until_last_body_chunk():
+    msg = stored_message()
+    seen = {}
+
+    async def app(scope, receive, send):
+        scope["route"] = FakeRoute()
+        await asyncio.to_thread(tracing.mark_delivered, [msg])
+        seen["after_route"] = msg["trace"]["delivered"]
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b"a", "more_body": True})
+        seen["after_first_chunk"] = msg["trace"]["delivered"]
+        await send({"type": "http.response.body", "body": b"b"})
+
+    run_request(app)
+    assert seen["after_route"] is None
+    assert seen["after_first_chunk"] is None
+    assert msg["trace"]["delivered"] is not None
+    assert delivered_count() == 1
+    assert "GET /api/chat/messages" in tracing.snapshot()["calls"]
+
+
+def test_failed_request_releases_claim():
+    msg = stored_message()
+
+    async def app(scope, receive, send):
+        await asyncio.to_thread(tracing.mark_delivered, [msg])
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run_request(app)
+    assert "delivered" not in msg["trace"]
+
+    tracing.mark_delivered([msg])
+    assert delivered_count() == 1
+
+
+def test_slowest_keeps_only_top_profiles(monkeypatch):
+    monkeypatch.setattr(tracing, "PROFILE_KEEP", 3)
+    for duration in (5.0, 1.0, 9.0, 3.0, 7.0, 2.0):
+        profiler = cProfile.Profile()
+        profiler.runcall(sum, [])
+        tracing._keep_profile("call", duration, profiler)
+    durations = [p["durationMs"] for p in tracing.slowest_profiles()]
+    assert durations == [9.0, 7.0, 5.0]
+
+
+def test_route_profile_ranked_by_whole_request():
+    tracing.arm_profiling(5)
+    try:
+        @tracing.profiled("GET /api/chat/messages")
+        def endpoint():
+            return "ok"
+
+        async def app(scope, receive, send):
+            scope["route"] = FakeRoute()
+            await asyncio.to_thread(endpoint)
+            await asyncio.sleep(0.02)  # sérialisation, hors du corps de la route
+            await send({"type": "http.response.body", "body": b""})
+
+        run_request(app)
+        (profile,) = tracing.slowest_profiles()
+    finally:
+        tracing.arm_profiling(0)
+
+    assert profile["durationMs"] >= 20
+    assert profile["bodyMs"] < profile["durationMs"]
+
+
+def test_reset_clears_stats():
+    tracing.mark_delivered([stored_message()])
+
+    @tracing.traced("cb")
+    def callback():
+        pass
+
+    callback()
+    assert tracing.snapshot()["stages"] and tracing.snapshot()["calls"]
+    tracing.reset()
+    snap = tracing.snapshot()
+    assert snap["stages"] == {} and snap["calls"] == {}
+
+
+def test_summary_percentiles():
+    summary = tracing._summary([float(v) for v in range(100, 0, -1)])
+    assert summary == {"count": 100, "min": 1.0, "p50": 51.0, "p90": 91.0, "p99": 100.0, "max": 100.0}
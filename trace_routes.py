@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, Query
+
+from models import SessionUser
+from auth_routes import require_admin
+import tracing
+
+
+router = APIRouter(prefix="/trace", tags=["trace"])
+
+
+@router.get("/latency")
+def trace_latency(user: SessionUser = Depends(require_admin)):
+    """Latences (ms) par étape du pipeline MQTT -> navigateur, échantillonnées."""
+    return tracing.snapshot()
+
+
+@router.post("/reset")
+def trace_reset(user: SessionUser = Depends(require_admin)):
+    tracing.reset()
+    return {"success": True}
+
+
+@router.post("/profile")
+def trace_profile_start(
+    seconds: float = Query(30, gt=0, le=tracing.PROFILE_MAX_SECONDS),
+    user: SessionUser = Depends(require_admin),
+):
+    """
+    Active le profilage cProfile des routes et callbacks tracés pendant `seconds`.
+    Les profils des appels les plus lents sont lisibles via GET /trace/profile.
+    """
+    armed = tracing.arm_profiling(seconds)
+    return {"success": True, "seconds": armed}
+
+
+@router.get("/profile")
+def trace_profile(user: SessionUser = Depends(require_admin)):
+    """
+    Profils des appels les plus lents, classés sur durationMs (requête complète).
+    Les stats cProfile ne couvrent que le corps de la route (bodyMs) : l'écart
+    avec durationMs correspond à la session, require_auth et la sérialisation.
+    """
+    return {
+        "profiling": tracing.profile_active(),
+        "slowest": tracing.slowest_profiles(),
+    }
@@ -0,0 +1,350 @@
+import cProfile
+import contextvars
+import functools
+import heapq
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# ==========================
+# Config tracing
+# ==========================
+
+# Proportion des messages / appels dont les latences sont enregistrées.
+# Le marquage des messages est toujours fait (quelques appels à monotonic_ns),
+# seul l'enregistrement dans les distributions est échantillonné.
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_WINDOW = int(os.environ.get("TRACE_WINDOW", "1000"))  # échantillons gardés par étape
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "5"))  # profils les plus lents gardés
+PROFILE_MAX_SECONDS = 300
+# Au-delà, une première livraison n'est pas comptée (voir "delivered" ci-dessous)
+TRACE_DELIVERY_MAX_MS = float(os.environ.get("TRACE_DELIVERY_MAX_MS", "10000"))
+
+# Étapes du pipeline, dans l'ordre où elles sont marquées :
+#   received  : réception du paquet par paho (msg.timestamp)
+#   callback  : entrée dans _on_message
+#   parsed    : décodage + json.loads terminés
+#   stored    : message inséré dans l'historique
+#   delivered : réponse contenant le message envoyée pour la première fois
+#               au navigateur (polling, sérialisation comprise). Si plus de
+#               TRACE_DELIVERY_MAX_MS se sont écoulées depuis "stored", personne
+#               ne pollait (page fermée, historique chargé d'un coup) : la
+#               livraison est ignorée pour ne pas fausser p90/p99/max.
+STAGES = ("received", "callback", "parsed", "stored", "delivered")
+
+# ==========================
+# État en mémoire
+# ==========================
+
+_lock = threading.Lock()
+_stage_latencies: Dict[str, Deque[float]] = {}
+_call_latencies: Dict[str, Deque[float]] = {}
+
+# État de la requête HTTP en cours, posé par TracingMiddleware :
+#   "pending" : traces à marquer "delivered" une fois la réponse envoyée
+#   "profile" : (profiler, durée du corps en ms) de la route, classé par le middleware
+# Le dict est partagé avec le threadpool des routes sync (copie du contexte).
+_request: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "tracing_request", default=None
+)
+
+# Profilage à la demande (activé par un admin pour une durée limitée)
+_profile_until: float = 0.0
+_profile_lock = threading.Lock()  # un seul cProfile actif à la fois
+_slowest: List[Tuple[float, int, Dict[str, Any]]] = []  # tas min (durée, seq, profil)
+_profile_seq = 0
+
+
+def _now() -> int:
+    return time.monotonic_ns()
+
+
+def _sampled() -> bool:
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+def _record(store: Dict[str, Deque[float]], key: str, value_ms: float) -> None:
+    with _lock:
+        samples = store.get(key)
+        if samples is None:
+            samples = store[key] = deque(maxlen=TRACE_WINDOW)
+        samples.append(value_ms)
+
+
+# ==========================
+# Marquage des messages
+# ==========================
+
+def start_trace(msg) -> Dict[str, Any]:
+    """
+    Crée les marques de temps d'un message MQTT entrant.
+
+    paho horodate chaque PUBLISH reçu avec time.monotonic() (msg.timestamp),
+    ce qui donne le temps passé dans la boucle réseau avant le callback.
+    """
+    now = _now()
+    received = getattr(msg, "timestamp", None)
+    trace = {
+        "sampled": _sampled(),
+        "received": int(received * 1e9) if received else now,
+        "callback": now,
+    }
+    return trace
+
+
+def mark(trace: Optional[Dict[str, Any]], stage: str) -> None:
+    """Marque la fin d'une étape pour un message."""
+    if trace is not None:
+        trace[stage] = _now()
+
+
+def finish(trace: Optional[Dict[str, Any]]) -> None:
+    """Enregistre les latences entre étapes successives si le message est échantillonné."""
+    if trace is None or not trace.get("sampled"):
+        return
+    previous = None
+    for stage in STAGES:
+        ts = trace.get(stage)
+        if ts is None:
+            continue
+        if previous is not None:
+            _record(_stage_latencies, stage, (ts - previous) / 1e6)
+        previous = ts
+    _record(_stage_latencies, "total", (previous - trace["received"]) / 1e6)
+
+
+def mark_delivered(messages) -> None:
+    """
+    À appeler dans une route qui renvoie des messages au navigateur.
+    Seule la première livraison d'un message est comptée (réservée sous verrou,
+    les polls concurrents tournent dans le threadpool).
+    Derrière TracingMiddleware, le marquage est fait après l'envoi de la réponse.
+    """
+    claimed = []
+    with _lock:
+        for m in messages:
+            trace = m.get("trace") if isinstance(m, dict) else None
+            if trace is not None and "delivered" not in trace:
+                trace["delivered"] = None
+                claimed.append(trace)
+    if not claimed:
+        return
+    request = _request.get()
+    if request is not None:
+        request["pending"].extend(claimed)
+    else:
+        _deliver(claimed)
+
+
+def _deliver(traces: List[Dict[str, Any]]) -> None:
+    for trace in traces:
+        mark(trace, "delivered")
+        if (trace["delivered"] - trace.get("stored", trace["received"])) / 1e6 <= TRACE_DELIVERY_MAX_MS:
+            finish(trace)
+
+
+def _release(traces: List[Dict[str, Any]]) -> None:
+    """Rend les traces réservées mais non livrées (erreur, client parti)."""
+    with _lock:
+        for trace in traces:
+            if trace.get("delivered", 0) is None:
+                trace.pop("delivered", None)
+
+
+def public(message: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Copie d'un message sans les marques internes (pour la sérialisation)."""
+    if message is None or "trace" not in message:
+        return message
+    return {k: v for k, v in message.items() if k != "trace"}
+
+
+# ==========================
+# Appels (routes, callbacks)
+# ==========================
+
+def profile_active() -> bool:
+    return time.monotonic() < _profile_until
+
+
+def arm_profiling(seconds: float) -> float:
+    """Active le profilage cProfile des appels tracés pendant `seconds` secondes."""
+    global _profile_until
+    seconds = max(0.0, min(float(seconds), PROFILE_MAX_SECONDS))
+    with _lock:
+        _profile_until = time.monotonic() + seconds
+        _slowest.clear()
+    return seconds
+
+
+def _keep_profile(label: str, duration_ms: float, profiler: cProfile.Profile,
+                  body_ms: Optional[float] = None) -> None:
+    """
+    Garde le profil s'il fait partie des PROFILE_KEEP appels les plus lents.
+    Pour une requête, duration_ms est la durée complète et body_ms celle du
+    corps de la route (seule partie couverte par les stats cProfile).
+    """
+    global _profile_seq
+    with _lock:
+        if len(_slowest) >= PROFILE_KEEP and duration_ms <= _slowest[0][0]:
+            return
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+    entry = {
+        "label": label,
+        "durationMs": round(duration_ms, 3),
+        "at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "stats": out.getvalue(),
+    }
+    if body_ms is not None:
+        entry["bodyMs"] = round(body_ms, 3)
+    with _lock:
+        _profile_seq += 1
+        item = (duration_ms, _profile_seq, entry)
+        if len(_slowest) < PROFILE_KEEP:
+            heapq.heappush(_slowest, item)
+        else:
+            heapq.heappushpop(_slowest, item)
+
+
+def _wrap(label: str, func: Callable, record: bool) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = None
+        if profile_active() and _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        start = time.perf_counter_ns()
+        try:
+            if profiler is None:
+                return func(*args, **kwargs)
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            duration_ms = (time.perf_counter_ns() - start) / 1e6
+            if profiler is not None:
+                _profile_lock.release()
+                request = _request.get() if not record else None
+                if request is not None:
+                    # Classé par le middleware sur la durée complète de la requête
+                    request["profile"] = (profiler, duration_ms)
+                else:
+                    _keep_profile(label, duration_ms, profiler)
+            if record and _sampled():
+                _record(_call_latencies, label, duration_ms)
+    return wrapper
+
+
+def traced(label: str) -> Callable:
+    """
+    Décorateur pour mesurer la durée d'un callback (ex: _on_message).
+
+    Hors profilage, le coût est un appel à perf_counter_ns et un tirage aléatoire.
+    Quand le profilage est armé, l'appel tourne sous cProfile (si aucun autre
+    profil n'est en cours) et les plus lents sont conservés.
+    """
+    return lambda func: _wrap(label, func, record=True)
+
+
+def profiled(label: str) -> Callable:
+    """
+    Décorateur pour les routes : profilage cProfile du corps de la route.
+
+    Derrière TracingMiddleware, les profils sont classés sur la durée complète
+    de la requête (durationMs) ; bodyMs donne la part du corps de la route, la
+    différence étant la session, les dépendances et la sérialisation.
+    """
+    return lambda func: _wrap(label, func, record=False)
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI qui mesure chaque requête /api de bout en bout :
+    session, dépendances (require_auth), route et sérialisation, jusqu'à l'envoi
+    du dernier morceau de la réponse. Marque aussi "delivered" à ce moment-là.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        request: Dict[str, Any] = {"pending": [], "profile": None}
+        token = _request.set(request)
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                duration_ms = (time.perf_counter_ns() - start) / 1e6
+                if request["pending"]:
+                    _deliver(request["pending"])
+                    request["pending"].clear()
+                # Route résolue par FastAPI (scope["route"]) pour éviter un label par URL
+                path = getattr(scope.get("route"), "path", None)
+                label = f"{scope['method']} {path or scope['path']}"
+                if request["profile"] is not None:
+                    profiler, body_ms = request["profile"]
+                    request["profile"] = None
+                    _keep_profile(label, duration_ms, profiler, body_ms)
+                if path is not None and _sampled():
+                    _record(_call_latencies, label, duration_ms)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request.reset(token)
+            # Réponse non envoyée jusqu'au bout : une autre requête pourra les livrer
+            _release(request["pending"])
+
+
+# ==========================
+# Lecture des statistiques
+# ==========================
+
+def _summary(samples: List[float]) -> Dict[str, Any]:
+    samples = sorted(samples)
+    n = len(samples)
+
+    def pct(p: float) -> float:
+        return round(samples[min(n - 1, int(p * n))], 3)
+
+    return {
+        "count": n,
+        "min": round(samples[0], 3),
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p99": pct(0.99),
+        "max": round(samples[-1], 3),
+    }
+
+
+def snapshot() -> Dict[str, Any]:
+    """Distributions de latence (ms) par étape et par appel."""
+    with _lock:
+        stages = {k: list(v) for k, v in _stage_latencies.items() if v}
+        calls = {k: list(v) for k, v in _call_latencies.items() if v}
+    ordered = [s for s in STAGES[1:] + ("total",) if s in stages]
+    return {
+        "sampleRate": TRACE_SAMPLE_RATE,
+        "stages": {s: _summary(stages[s]) for s in ordered},
+        "calls": {k: _summary(v) for k, v in sorted(calls.items())},
+        "profiling": profile_active(),
+    }
+
+
+def slowest_profiles() -> List[Dict[str, Any]]:
+    with _lock:
+        items = sorted(_slowest, reverse=True)
+    return [entry for _, _, entry in items]
+
+
+def reset() -> None:
+    with _lock:
+        _stage_latencies.clear()
+        _call_latencies.clear()